@@ -1,93 +1,268 @@
+import asyncio
+import signal
+import threading
 from time import sleep
 from polybot import Bot
 import logging
-from groq import Groq
+from groq import APIConnectionError, APIStatusError, DefaultHttpxClient, Groq, RateLimitError
+import httpx
 import os
 import json
 from datetime import datetime
 import hashlib
+import random
+import re
+from collections import Counter, deque
+
+LIST_MARKER = re.compile(r"^\s*(?:[-*\u2022]|\d+[.)])\s+")
+# Openings of the remarks models like to wrap a list of posts in
+SIGN_OFF = re.compile(
+    r"(?:i hope|hope you|let me know|feel free|enjoy|here (?:are|is)|here's|these (?:facts|posts))\b",
+    re.IGNORECASE,
+)
 
 class TechNewsBot(Bot):
     def __init__(self, name):
         super().__init__(name)
-        # Initialize Groq client
-        self.groq_client = Groq(api_key=os.getenv('GROQ_API_KEY'))
+        # Initialize Groq client, reusing one pooled keep-alive connection across requests
+        self.http_client = DefaultHttpxClient(
+            limits=httpx.Limits(max_keepalive_connections=5, keepalive_expiry=60),
+            timeout=30.0,
+        )
+        # Retries are handled by create_completion so rate limits get their own backoff
+        self.groq_client = Groq(
+            api_key=os.getenv('GROQ_API_KEY'), http_client=self.http_client, max_retries=0
+        )
+        self.api_max_retries = 5
+        self.api_backoff_base = 1.0  # seconds
+        self.api_backoff_max = 60.0  # seconds
         self.system_prompt = """You are a tech news and facts bot. Generate interesting, 
         engaging posts about technology, gaming, software, hardware, or tech history. 
         Keep posts informative yet concise, under 300 characters. Include only verified, 
-        factual information. Format as a single post without hashtags or citations."""
+        factual information. Format each post as a single line without hashtags or citations."""
         
         # Initialize posts history
-        self.history_file = 'post_history.json'
+        self.history_file = 'post_history.ndjson'
+        self.legacy_history_file = 'post_history.json'
         self.post_history = self.load_post_history()
+        self._hash_set = set()
+        self._shingle_counts = Counter()
+        for historical_post in self.post_history:
+            self._hash_set.add(historical_post['hash'])
+            self._shingle_counts.update(self.shingles(historical_post['content']))
 
     def load_post_history(self):
-        """Load post history from JSON file"""
+        """Load the last 1000 posts from the NDJSON history file"""
+        posts = deque(maxlen=1000)
         try:
             if os.path.exists(self.history_file):
-                with open(self.history_file, 'r') as f:
-                    return json.load(f)
-            return {'posts': []}
+                with open(self.history_file) as f:
+                    lines = deque(f, maxlen=1000)
+                for line in lines:
+                    if not line.strip():
+                        continue
+                    try:
+                        posts.append(json.loads(line))
+                    except ValueError:
+                        # Most likely a line torn by a crash mid-write; skip it rather than lose the rest
+                        self.log.warning(f"Skipping unreadable post history line: {line[:80]!r}")
+                if lines and not lines[-1].endswith('\n'):
+                    # Terminate a torn final line so the next append starts on a fresh line
+                    with open(self.history_file, 'ab') as f:
+                        f.write(b'\n')
+            elif os.path.exists(self.legacy_history_file):
+                # Convert the old single-document JSON history to NDJSON
+                with open(self.legacy_history_file) as f:
+                    posts.extend(json.load(f)['posts'])
+                for post_data in posts:
+                    # Entries saved before the switch from MD5 carry a 32-character digest
+                    if len(post_data['hash']) != 16:
+                        post_data['hash'] = self.post_hash(post_data['content'])
+                    self._append_history(post_data)
         except Exception as e:
             self.log.error(f"Error loading post history: {e}")
-            return {'posts': []}
+        return posts
 
-    def save_post_history(self):
-        """Save post history to JSON file"""
+    def _append_history(self, post_data):
+        """Append a single post record to the NDJSON history file"""
         try:
-            with open(self.history_file, 'w') as f:
-                json.dump(self.post_history, f, indent=2)
+            with open(self.history_file, 'ab') as f:
+                f.write(json.dumps(post_data).encode() + b'\n')
         except Exception as e:
             self.log.error(f"Error saving post history: {e}")
 
-    def is_duplicate(self, post):
+    @staticmethod
+    def post_hash(post):
+        """Fast non-cryptographic digest of the normalised post text"""
+        return hashlib.blake2b(post.lower().encode(), digest_size=8).hexdigest()
+
+    @staticmethod
+    def shingles(post, size=5):
+        """Split post into overlapping word n-grams for near-duplicate checks"""
+        words = re.findall(r"\w+", post.lower())
+        return [' '.join(words[i:i + size]) for i in range(len(words) - size + 1)]
+
+    def is_duplicate(self, key, shingles):
         """Check if post is too similar to previous posts"""
-        # Create a hash of the post content
-        post_hash = hashlib.md5(post.lower().encode()).hexdigest()
-        
         # Check if this exact hash exists in history
-        for historical_post in self.post_history['posts']:
-            if historical_post['hash'] == post_hash:
-                return True
-            
-        return False
+        if key in self._hash_set:
+            return True
+
+        # Catch paraphrases: most of a sample of the post's shingles have been posted before
+        sample = shingles[:8]
+        seen = sum(1 for shingle in sample if shingle in self._shingle_counts)
+        return bool(sample) and seen * 2 >= len(sample)
 
-    def add_to_history(self, post):
+    def add_to_history(self, post, key, shingles):
         """Add post to history"""
         post_data = {
             'content': post,
-            'hash': hashlib.md5(post.lower().encode()).hexdigest(),
+            'hash': key,
             'timestamp': datetime.now().isoformat()
         }
-        self.post_history['posts'].append(post_data)
-        
-        # Keep only last 1000 posts in history
-        if len(self.post_history['posts']) > 1000:
-            self.post_history['posts'] = self.post_history['posts'][-1000:]
-            
-        self.save_post_history()
+
+        # The history deque only keeps the last 1000 posts, so forget the one about to drop out
+        if len(self.post_history) == self.post_history.maxlen:
+            old_post = self.post_history[0]
+            self._hash_set.discard(old_post['hash'])
+            for shingle in self.shingles(old_post['content']):
+                self._shingle_counts[shingle] -= 1
+                if self._shingle_counts[shingle] <= 0:
+                    del self._shingle_counts[shingle]
+
+        self.post_history.append(post_data)
+        self._hash_set.add(post_data['hash'])
+        self._shingle_counts.update(shingles)
+
+        self._append_history(post_data)
+
+    @staticmethod
+    def is_retryable(error):
+        """Mirror the Groq SDK's own retry rules for API errors"""
+        if isinstance(error, APIConnectionError):
+            # Covers timeouts and dropped keep-alive connections
+            return True
+        should_retry = error.response.headers.get('x-should-retry')
+        if should_retry in ('true', 'false'):
+            return should_retry == 'true'
+        return error.status_code in (408, 409, 429) or error.status_code >= 500
+
+    def create_completion(self, **kwargs):
+        """Create a Groq chat completion, backing off on transient errors and rate limits"""
+        for attempt in range(self.api_max_retries + 1):
+            try:
+                return self.groq_client.chat.completions.create(**kwargs)
+            except (APIConnectionError, APIStatusError) as e:
+                if attempt == self.api_max_retries or not self.is_retryable(e):
+                    raise
+                delay = None
+                if isinstance(e, RateLimitError):
+                    try:
+                        delay = float(e.response.headers.get('retry-after'))
+                    except (TypeError, ValueError):
+                        pass
+                    # Token and daily limits ask for long waits; leave those to the main loop
+                    if delay is not None and delay > self.api_backoff_max:
+                        raise
+                if delay is None:
+                    delay = min(
+                        self.api_backoff_base * 2 ** attempt + random.uniform(0, 0.5),
+                        self.api_backoff_max,
+                    )
+                reason = getattr(e, 'status_code', None) or type(e).__name__
+                self.log.warning(
+                    f"Groq API request failed ({reason}), retrying in {delay:.1f}s "
+                    f"(attempt {attempt + 1} of {self.api_max_retries})"
+                )
+                sleep(delay)
+
+    @staticmethod
+    def filter_candidates(lines, min_chars=40):
+        """Yield the lines of a batch completion that look like posts, without list markers"""
+        listed_batch = False
+        for line in lines:
+            # Strip any list numbering or bullets the model adds despite being asked not to
+            text, listed = LIST_MARKER.subn('', line)
+            text = text.strip()
+            # Drop preambles like "Here are 5 tech facts:", sign-offs and fragments too short to post
+            if text.endswith(':') or len(text) < min_chars or SIGN_OFF.match(text):
+                continue
+            if listed:
+                listed_batch = True
+            elif listed_batch:
+                # Once the model numbers its posts, any unnumbered line is commentary
+                continue
+            yield text
+
+    @classmethod
+    def parse_candidates(cls, text, min_chars=40):
+        """Split a batch completion into individual posts, one per line"""
+        return list(cls.filter_candidates(text.splitlines(), min_chars))
+
+    @staticmethod
+    def stream_lines(stream, max_chars=300):
+        """Yield lines from a streamed completion as each one completes"""
+        line = ''
+        skip_rest = False  # The current line hit max_chars and has already been yielded
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            for i, part in enumerate((chunk.choices[0].delta.content or '').split('\n')):
+                if i > 0:
+                    # A newline ended the previous line
+                    if not skip_rest:
+                        yield line
+                    line, skip_rest = '', False
+                if skip_rest:
+                    continue
+                line += part
+                if len(line) >= max_chars:
+                    # Long enough to fill a post, so there is no need to wait for the rest
+                    yield line
+                    line, skip_rest = '', True
+        yield line
+
+    def stream_candidates(self, stream, max_chars=300):
+        """Yield candidate posts from a streamed batch completion as each line completes"""
+        return self.filter_candidates(self.stream_lines(stream, max_chars))
 
     def generate_post(self):
+        """Generate a unique post, returning a (post, key, shingles) tuple or None"""
         max_attempts = 5  # Maximum number of attempts to generate unique content
+        batch_size = 5  # Candidate posts requested per API call
         
         for attempt in range(max_attempts):
             try:
-                chat_completion = self.groq_client.chat.completions.create(
+                stream = self.create_completion(
                     messages=[
                         {"role": "system", "content": self.system_prompt},
-                        {"role": "user", "content": "Generate a unique tech fact or news update different from common knowledge."}
+                        {"role": "user", "content": (
+                            f"Generate {batch_size} different unique tech facts or news updates different "
+                            "from common knowledge. Output only the posts, each on its own line, "
+                            "without numbering and with no introduction or closing remarks."
+                        )}
                     ],
                     model="llama-3.1-70b-versatile",
-                    max_tokens=100,
-                    temperature=0.9  # Increased temperature for more variety
+                    max_tokens=100 * batch_size,
+                    temperature=0.9,  # Increased temperature for more variety
+                    stream=True
                 )
                 
-                post = chat_completion.choices[0].message.content.strip()
-                
-                if post and not self.is_duplicate(post):
-                    return post
-                else:
-                    self.log.info(f"Generated duplicate content, attempt {attempt + 1} of {max_attempts}")
+                try:
+                    for post in self.stream_candidates(stream):
+                        # Ensure post meets length requirements
+                        if len(post) > 300:
+                            post = f"{post[:299]}\u2026"
+
+                        key = self.post_hash(post)
+                        shingles = self.shingles(post)
+                        if not self.is_duplicate(key, shingles):
+                            return post, key, shingles
+                finally:
+                    # Stop reading (and generating) the remaining candidates
+                    stream.close()
+
+                self.log.info(f"Generated only duplicate content, attempt {attempt + 1} of {max_attempts}")
                     
             except Exception as e:
                 self.log.error(f"Error generating post: {e}")
@@ -97,34 +272,87 @@ class TechNewsBot(Bot):
         return None
 
     def main(self):
-        while True:
+        # Never repost the same fact within an hour, even if the history check misses it
+        for service in self.services.values():
+            service.recent_post_ttl = 3600
+        try:
+            asyncio.run(self.run_loop())
+        finally:
+            self.http_client.close()
+
+    def publish(self, post, key, shingles):
+        """Post to Bluesky and record the post in the history"""
+        self.post(post)
+        self.log.info(f"Posted: {post}")
+        self.log.warning("Positng again in 20 minutes")
+
+        # Add to history after successful posting
+        self.add_to_history(post, key, shingles)
+
+    async def run_in_daemon_thread(self, func, *args):
+        """Run a blocking call in a daemon thread, which shutdown does not wait for"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def resolve(result, error):
+            if future.done():
+                return
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+        def worker():
             try:
-                # Generate a new post using Groq
-                post = self.generate_post()
-                
-                if post:
-                    # Ensure post meets length requirements
-                    if len(post) > 300:
-                        post = post[:297] + "..."
+                result, error = func(*args), None
+            except Exception as e:
+                result, error = None, e
+            try:
+                loop.call_soon_threadsafe(resolve, result, error)
+            except RuntimeError:
+                pass  # The event loop has already shut down
+
+        threading.Thread(target=worker, daemon=True).start()
+        return await future
+
+    async def run_loop(self):
+        # Cancel the loop on shutdown signals so long waits end immediately
+        loop = asyncio.get_running_loop()
+        task = asyncio.current_task()
+        previous_handlers = {}
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            previous_handlers[signum] = signal.getsignal(signum)
+            loop.add_signal_handler(signum, task.cancel)
+
+        try:
+            while True:
+                try:
+                    # Generate a new post using Groq. Nothing is lost by abandoning this on
+                    # shutdown, so it runs in a daemon thread rather than the default executor.
+                    generated = await self.run_in_daemon_thread(self.generate_post)
                     
-                    # Post to Bluesky
-                    self.post(post)
-                    self.log.info(f"Posted: {post}")
-                    self.log.warning("Positng again in 20 minutes")
-
-                    # Add to history after successful posting
-                    self.add_to_history(post)
-                else:
-                    self.log.warning("Failed to generate post, will retry in 5 minutes")
-                    sleep(300)
-                    continue
+                    if generated:
+                        # Posting and recording run together in one worker call, which
+                        # asyncio.run waits for, so a post is never published without being recorded
+                        await asyncio.to_thread(self.publish, *generated)
+                    else:
+                        self.log.warning("Failed to generate post, will retry in 5 minutes")
+                        await asyncio.sleep(300)
+                        continue
 
-                # Wait for an hour before next post
-                sleep(3600)
+                    # Wait for an hour before next post
+                    await asyncio.sleep(3600)
 
-            except Exception as e:
-                self.log.error(f"Error in main loop: {e}")
-                sleep(60)  # If there's an error, wait 1 minute before retrying
+                except Exception as e:
+                    self.log.error(f"Error in main loop: {e}")
+                    await asyncio.sleep(60)  # If there's an error, wait 1 minute before retrying
+        except asyncio.CancelledError:
+            self.log.info("Main loop cancelled, shutting down")
+        finally:
+            # Hand signals back to Bot.signal once the loop is done
+            for signum, handler in previous_handlers.items():
+                loop.remove_signal_handler(signum)
+                signal.signal(signum, handler)
 
 if __name__ == "__main__":
     # Set up logging
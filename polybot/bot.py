@@ -1,5 +1,6 @@
 import argparse
 import configparser
+import gc
 import logging
 import pickle
 import signal
@@ -9,6 +10,9 @@ from typing import Any, Optional, Union
 from .image import Image
 from .service import ALL_SERVICES, PostError, Service
 
+# Pickle issues many small reads/writes, so give the state file a larger buffer
+STATE_BUFFER_SIZE = 64 * 1024
+
 
 class Bot:
     path = ""
@@ -42,7 +46,7 @@ class Bot:
         self.log = logging.getLogger(__name__)
 
         self.name = name
-        self.services: list[Service] = []
+        self.services: dict[str, Service] = {}
         self.state: Any = {}
 
     def run(self) -> None:
@@ -74,7 +78,7 @@ class Bot:
             if Svc.name in self.config:
                 svc = Svc(self.config, self.args.live)
                 svc.auth()
-                self.services.append(svc)
+                self.services[Svc.name] = svc
 
         if len(self.services) == 0:
             self.log.warning("No services to post to. Use --setup to configure some!")
@@ -124,8 +128,14 @@ class Bot:
 
     def load_state(self) -> None:
         try:
-            with open(self.state_path, "rb") as f:
-                self.state = pickle.load(f)
+            with open(self.state_path, "rb", buffering=STATE_BUFFER_SIZE) as f:
+                gc_was_enabled = gc.isenabled()
+                gc.disable()
+                try:
+                    self.state = pickle.load(f)
+                finally:
+                    if gc_was_enabled:
+                        gc.enable()
         except OSError:
             self.log.info("No state file found")
 
@@ -133,8 +143,14 @@ class Bot:
         """Save the bot's state to disk."""
         if len(self.state) != 0:
             self.log.info("Saving state...")
-            with open(self.state_path, "wb") as f:
-                pickle.dump(self.state, f, pickle.HIGHEST_PROTOCOL)
+            with open(self.state_path, "wb", buffering=STATE_BUFFER_SIZE) as f:
+                gc_was_enabled = gc.isenabled()
+                gc.disable()
+                try:
+                    pickle.dump(self.state, f, pickle.HIGHEST_PROTOCOL)
+                finally:
+                    if gc_was_enabled:
+                        gc.enable()
 
     def post(
         self,
@@ -175,13 +191,10 @@ class Bot:
             self.log.info("Images: %s", images)
 
         out = {}
-        for service in self.services:
+        for name, service in self.services.items():
             try:
-                if in_reply_to_id:
-                    in_reply_to_id = in_reply_to_id[service.name]
-                out[service.name] = service.post(
-                    status, wrap, images, lat, lon, in_reply_to_id
-                )
+                reply_ref = in_reply_to_id[name] if in_reply_to_id else None
+                out[name] = service.post(status, wrap, images, lat, lon, reply_ref)
             except PostError:
                 self.log.exception("Error posting to %s", service)
         return out
@@ -1,15 +1,12 @@
+import hashlib
 import logging
 import mimetypes
 import textwrap
+from collections import OrderedDict
 from importlib.metadata import PackageNotFoundError, version
 from io import BytesIO
 from time import time
-from typing import Optional, Union
-
-import httpx
-from atproto import Client, models  # type: ignore
-from atproto_client.exceptions import RequestException  # type: ignore
-from mastodon import Mastodon as MastodonClient  # type: ignore
+from typing import Any, Optional, Union
 
 from .image import Image
 
@@ -33,6 +30,10 @@ class Service:
     max_image_size: int = int(10e6)
     max_image_pixels: Optional[int] = None
     max_image_count: int = 4
+    # When set, identical top-level posts made within this many seconds are skipped and
+    # return the earlier post's reference. Off by default.
+    recent_post_ttl: Optional[int] = None
+    recent_post_max = 64
 
     def __init__(self, config, live: bool) -> None:
         self.log = logging.getLogger(__name__)
@@ -41,6 +42,8 @@ class Service:
         self.user_agent = (
             f"Polybot/{POLYBOT_VERSION} (https://github.com/russss/polybot)"
         )
+        self._wrappers: dict[int, textwrap.TextWrapper] = {}
+        self.recent_posts: OrderedDict[str, tuple[float, Any]] = OrderedDict()
 
     def auth(self) -> None:
         raise NotImplementedError()
@@ -51,9 +54,12 @@ class Service:
     def longest_allowed(self, status: list, images: list[Image]) -> str:
         max_len = self.max_length_image if images else self.max_length
         picked = status[0]
-        for s in sorted(status, key=len):
-            if len(s) < max_len:
-                picked = s
+        best = -1
+        for s in status:
+            length = len(s)
+            # Ties go to the later candidate
+            if best <= length < max_len:
+                picked, best = s, length
         return picked
 
     def post(
@@ -70,11 +76,38 @@ class Service:
             for i in images[: self.max_image_count]
         ]
         if self.live:
-            if wrap:
-                return self.do_wrapped(status, images, lat, lon, in_reply_to_id)
             if isinstance(status, list):
                 status = self.longest_allowed(status, images)
-            return self.do_post(status, images, lat, lon, in_reply_to_id)
+
+            # Replies are never cached: their target is part of what makes them distinct
+            key = None
+            if self.recent_post_ttl and not in_reply_to_id:
+                key = self.recent_post_key(status, images, wrap)
+                expiry, out = self.recent_posts.get(key, (0, None))
+                if expiry > time():
+                    self.log.warning("Skipping %s post, identical to a recent post", self.name)
+                    return out
+
+            if wrap:
+                out = self.do_wrapped(status, images, lat, lon, in_reply_to_id)
+            else:
+                out = self.do_post(status, images, lat, lon, in_reply_to_id)
+            if key is not None and out is not None:
+                self.remember_post(key, out)
+            return out
+
+    def recent_post_key(self, status: str, images: list[Image], wrap: bool) -> str:
+        digest = hashlib.blake2b(status.lower().encode(), digest_size=8)
+        digest.update(b"wrap" if wrap else b"post")
+        for image in images:
+            digest.update(image.data)
+        return digest.hexdigest()
+
+    def remember_post(self, key: str, out) -> None:
+        self.recent_posts[key] = (time() + self.recent_post_ttl, out)
+        self.recent_posts.move_to_end(key)
+        while len(self.recent_posts) > self.recent_post_max:
+            self.recent_posts.popitem(last=False)
 
     def do_post(
         self,
@@ -86,6 +119,12 @@ class Service:
     ):
         raise NotImplementedError()
 
+    def wrapper(self, width: int) -> textwrap.TextWrapper:
+        """Return a TextWrapper for the given width, reusing one per width."""
+        if width not in self._wrappers:
+            self._wrappers[width] = textwrap.TextWrapper(width)
+        return self._wrappers[width]
+
     def do_wrapped(
         self,
         status,
@@ -96,10 +135,11 @@ class Service:
     ):
         max_len = self.max_length_image if images else self.max_length
         if len(status) > max_len:
-            wrapped = textwrap.wrap(status, max_len - self.ellipsis_length)
+            wrapped = self.wrapper(max_len - self.ellipsis_length).wrap(status)
         else:
             wrapped = [status]
         first = True
+        root = None
         for line in wrapped:
             if first and len(wrapped) > 1:
                 line = line + "\u2026"
@@ -113,17 +153,17 @@ class Service:
                     line, lat=lat, lon=lon, in_reply_to_id=in_reply_to_id
                 )
 
-            if isinstance(out, models.com.atproto.repo.strong_ref.Main):
-                if first:
-                    in_reply_to_id = {"root": out, "parent": out}
-                else:
-                    in_reply_to_id["parent"] = out
-            elif hasattr(out, "id"):
-                in_reply_to_id = out.id
-            else:
-                in_reply_to_id = out.data["id"]
+            if first:
+                root = out
+            in_reply_to_id = self.next_reply_id(out, in_reply_to_id, first)
             first = False
+        return root
 
+    def next_reply_id(self, out, in_reply_to_id, first: bool):
+        """Return the ID to reply to with the next post in a wrapped thread."""
+        if hasattr(out, "id"):
+            return out.id
+        return out.data["id"]
 
 
 class Bluesky(Service):
@@ -137,8 +177,14 @@ class Bluesky(Service):
         super().__init__(config, live)
         self.login_ratelimit_expiry = 0
         self.connected = False
+        # Freeze the section into a plain dict; it is absent while running setup
+        self._cfg = dict(config["bluesky"]) if config.has_section("bluesky") else {}
 
     def auth(self):
+        # atproto pulls in pydantic and hundreds of models, so only import it once Bluesky is used
+        from atproto import Client, models  # type: ignore
+
+        self._models = models
         self.bluesky = Client()
         if self.login_ratelimit_expiry > time():
             self.log.warning(
@@ -148,10 +194,12 @@ class Bluesky(Service):
             )
             return
 
+        from atproto_client.exceptions import RequestException  # type: ignore
+
         try:
             self.bluesky.login(
-                self.config.get("bluesky", "email"),
-                self.config.get("bluesky", "password"),
+                self._cfg["email"],
+                self._cfg["password"],
             )
         except RequestException as e:
             if e.response.status_code == 429:
@@ -191,6 +239,7 @@ class Bluesky(Service):
             self.log.warning("Skipping Bluesky post, not connected")
             return
 
+        models = self._models
         if in_reply_to_id:
             in_reply_to_id = models.AppBskyFeedPost.ReplyRef(
                 parent=in_reply_to_id["parent"], root=in_reply_to_id["root"]
@@ -213,5 +262,13 @@ class Bluesky(Service):
         except Exception as e:
             raise PostError(e)
 
+    def next_reply_id(self, out, in_reply_to_id, first: bool):
+        # Bluesky threads reference both the root post and the immediate parent
+        if out is None:
+            return in_reply_to_id
+        if first:
+            return {"root": out, "parent": out}
+        return {"root": in_reply_to_id["root"], "parent": out}
+
 
 ALL_SERVICES: list[type[Service]] = [Bluesky]
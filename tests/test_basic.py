@@ -1,3 +1,5 @@
+import gc
+
 from polybot import Bot
 
 
@@ -11,3 +13,34 @@ def test_init():
     bot = BotTest("test_bot")
     assert bot.name == "test_bot"
     bot.run()
+
+
+class FakeService:
+    def __init__(self, name):
+        self.name = name
+
+    def post(self, status, wrap, images, lat, lon, in_reply_to_id):
+        return in_reply_to_id
+
+
+def test_post_reply_ids_per_service():
+    bot = BotTest("test_bot")
+    bot.services = {name: FakeService(name) for name in ("bluesky", "other")}
+    out = bot.post("Hello", in_reply_to_id={"bluesky": "bsky-id", "other": "other-id"})
+    assert out == {"bluesky": "bsky-id", "other": "other-id"}
+
+
+def test_state_round_trip_keeps_gc_setting(tmp_path):
+    bot = BotTest("test_bot")
+    bot.state_path = str(tmp_path / "test_bot.state")
+    bot.state = {"posted": [1, 2, 3]}
+
+    gc.disable()
+    try:
+        bot.save_state()
+        bot.state = {}
+        bot.load_state()
+        assert not gc.isenabled()
+    finally:
+        gc.enable()
+    assert bot.state == {"posted": [1, 2, 3]}
@@ -0,0 +1,88 @@
+import configparser
+
+from polybot.service import Bluesky
+
+
+class FakeClient:
+    class me:
+        did = "did:plc:test"
+
+    def __init__(self):
+        self.sent = []
+        self.replies = []
+
+    def send_post(self, status, did, in_reply_to_id):
+        self.sent.append(status)
+        self.replies.append(in_reply_to_id)
+        return len(self.sent)
+
+
+class FakeModels:
+    class AppBskyFeedPost:
+        @staticmethod
+        def ReplyRef(parent, root):
+            return {"parent": parent, "root": root}
+
+    @staticmethod
+    def create_strong_ref(resp):
+        return f"ref{resp}"
+
+
+def connected_bluesky():
+    service = Bluesky(configparser.ConfigParser(), True)
+    service.bluesky = FakeClient()
+    service._models = FakeModels
+    service.connected = True
+    return service
+
+
+def test_repeat_posts_are_sent_by_default():
+    service = connected_bluesky()
+    service.post("Lift out of service")
+    service.post("Lift restored")
+    service.post("Lift out of service")
+    assert service.bluesky.sent == ["Lift out of service", "Lift restored", "Lift out of service"]
+
+
+def test_bluesky_skips_recent_duplicate():
+    service = connected_bluesky()
+    service.recent_post_ttl = 3600
+    assert service.post("Hello World") == "ref1"
+    assert service.post("hello world") == "ref1"
+    assert service.post("Something else") == "ref2"
+    assert service.bluesky.sent == ["Hello World", "Something else"]
+
+
+def test_bluesky_skips_recent_duplicate_thread():
+    service = connected_bluesky()
+    service.recent_post_ttl = 3600
+    service.max_length = 30
+    assert service.post("word " * 10, wrap=True) == "ref1"
+    assert service.post("word " * 10, wrap=True) == "ref1"
+    assert service.bluesky.sent == ["word word word word word word…", "…word word word word"]
+    assert service.bluesky.replies == [None, {"root": "ref1", "parent": "ref1"}]
+
+
+def test_wrapped_post_is_threaded():
+    service = connected_bluesky()
+    service.max_length = 30
+    service.do_wrapped("word " * 20)
+    assert service.bluesky.sent == [
+        "word word word word word word…",
+        "…word word word word word word",
+        "…word word word word word word",
+        "…word word",
+    ]
+    assert service.bluesky.replies == [
+        None,
+        {"root": "ref1", "parent": "ref1"},
+        {"root": "ref1", "parent": "ref2"},
+        {"root": "ref1", "parent": "ref3"},
+    ]
+
+
+def test_longest_allowed():
+    service = connected_bluesky()
+    assert service.longest_allowed(["short", "x" * 299, "x" * 400], []) == "x" * 299
+    assert service.longest_allowed(["y" * 500, "x" * 400], []) == "y" * 500
+    assert service.longest_allowed(["aa", "bb", "c"], []) == "bb"
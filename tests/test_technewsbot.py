@@ -0,0 +1,276 @@
+import asyncio
+import json
+import os
+import signal
+import threading
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+# The example bot needs the Groq SDK, which is not a polybot dependency
+groq = pytest.importorskip("groq")
+
+import helloworldbot  # noqa: E402
+from helloworldbot import TechNewsBot  # noqa: E402
+
+
+@pytest.fixture
+def bot(tmp_path, monkeypatch):
+    monkeypatch.setenv("GROQ_API_KEY", "test-key")
+    monkeypatch.chdir(tmp_path)
+    return TechNewsBot("test_bot")
+
+
+def add(bot, post):
+    bot.add_to_history(post, bot.post_hash(post), bot.shingles(post))
+
+
+def read_history(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_legacy_history_is_migrated(tmp_path, monkeypatch):
+    content = "The first computer mouse was carved from a block of wood in 1964."
+    legacy = {"posts": [{"content": content, "hash": "0" * 32, "timestamp": "2025-01-08T00:00:00"}]}
+    (tmp_path / "post_history.json").write_text(json.dumps(legacy))
+    monkeypatch.setenv("GROQ_API_KEY", "test-key")
+    monkeypatch.chdir(tmp_path)
+
+    bot = TechNewsBot("test_bot")
+    key = bot.post_hash(content)
+    assert [p["hash"] for p in bot.post_history] == [key]
+    assert [p["hash"] for p in read_history(tmp_path / "post_history.ndjson")] == [key]
+    assert bot.is_duplicate(key, bot.shingles(content))
+
+
+def test_torn_history_line_is_skipped(bot, tmp_path):
+    add(bot, "First post about computers")
+    with open(tmp_path / "post_history.ndjson", "a") as f:
+        f.write('{"content": "torn')
+
+    bot = TechNewsBot("test_bot")
+    assert [p["content"] for p in bot.post_history] == ["First post about computers"]
+
+    add(bot, "Second post about computers")
+    bot = TechNewsBot("test_bot")
+    assert [p["content"] for p in bot.post_history] == [
+        "First post about computers",
+        "Second post about computers",
+    ]
+
+
+def rate_limit_error(retry_after=None):
+    headers = {"retry-after": retry_after} if retry_after else {}
+    request = httpx.Request("POST", "https://api.groq.com/openai/v1/chat/completions")
+    response = httpx.Response(429, headers=headers, request=request)
+    return groq.RateLimitError("rate limited", response=response, body=None)
+
+
+def server_error():
+    request = httpx.Request("POST", "https://api.groq.com/openai/v1/chat/completions")
+    response = httpx.Response(503, request=request)
+    return groq.InternalServerError("unavailable", response=response, body=None)
+
+
+class FakeCompletions:
+    def __init__(self, *results):
+        self.results = list(results)
+
+    def create(self, **kwargs):
+        result = self.results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+def fake_groq(bot, *results):
+    completions = FakeCompletions(*results)
+    bot.groq_client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+
+
+def test_completion_backoff(bot, monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(helloworldbot, "sleep", sleeps.append)
+    fake_groq(bot, rate_limit_error("2"), server_error(), rate_limit_error(), "done")
+
+    assert bot.create_completion() == "done"
+    assert sleeps[0] == 2.0
+    assert 2.0 <= sleeps[1] <= 2.5
+    assert 4.0 <= sleeps[2] <= 4.5
+
+
+def test_completion_retries_timeouts_and_connection_errors(bot, monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(helloworldbot, "sleep", sleeps.append)
+    request = httpx.Request("POST", "https://api.groq.com/openai/v1/chat/completions")
+    fake_groq(bot, groq.APITimeoutError(request), groq.APIConnectionError(request=request), "done")
+
+    assert bot.create_completion() == "done"
+    assert len(sleeps) == 2
+
+
+def test_completion_client_errors_are_not_retried(bot, monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(helloworldbot, "sleep", sleeps.append)
+    request = httpx.Request("POST", "https://api.groq.com/openai/v1/chat/completions")
+    response = httpx.Response(400, request=request)
+    fake_groq(bot, groq.BadRequestError("bad request", response=response, body=None), "done")
+
+    with pytest.raises(groq.BadRequestError):
+        bot.create_completion()
+    assert sleeps == []
+
+
+def test_completion_long_retry_after_is_raised(bot, monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(helloworldbot, "sleep", sleeps.append)
+    fake_groq(bot, rate_limit_error("3600"), "done")
+
+    with pytest.raises(groq.RateLimitError):
+        bot.create_completion()
+    assert sleeps == []
+
+
+def test_parse_candidates():
+    text = (
+        "Here are 5 unique tech facts:\n"
+        "\n"
+        "1. The first 1GB hard drive, IBM's 3380, weighed over 250 kilograms.\n"
+        "2) The 3.5 inch floppy disk was introduced by Sony in 1981.\n"
+        "- Short line.\n"
+        "• Linux was first announced on a Usenet newsgroup in August 1991.\n"
+        "\n"
+        "These were chosen to be surprising even to long-time tech enthusiasts.\n"
+    )
+    assert TechNewsBot.parse_candidates(text) == [
+        "The first 1GB hard drive, IBM's 3380, weighed over 250 kilograms.",
+        "The 3.5 inch floppy disk was introduced by Sony in 1981.",
+        "Linux was first announced on a Usenet newsgroup in August 1991.",
+    ]
+
+
+def test_parse_candidates_drops_sign_off_from_unnumbered_batch():
+    text = (
+        "The first webcam watched a coffee pot at Cambridge University.\n"
+        "The original Game Boy survived a bombing during the Gulf War.\n"
+        "I hope you find these tech facts interesting and informative!\n"
+    )
+    assert TechNewsBot.parse_candidates(text) == [
+        "The first webcam watched a coffee pot at Cambridge University.",
+        "The original Game Boy survived a bombing during the Gulf War.",
+    ]
+
+
+def test_near_duplicate_needs_most_shingles(bot):
+    add(bot, "The Intel 4004, released in 1971, was the first commercially available microprocessor.")
+
+    reworded = "Fun fact: the Intel 4004, released in 1971, was the first commercially available CPU."
+    assert bot.is_duplicate(bot.post_hash(reworded), bot.shingles(reworded))
+
+    # Sharing a common opening phrase is not enough on its own
+    other = "The Intel 4004, released in 1971, ran at 740 kHz and powered the Busicom 141-PF calculator."
+    assert not bot.is_duplicate(bot.post_hash(other), bot.shingles(other))
+
+
+def test_history_eviction(bot):
+    oldest = "Post number zero about a shared gadget topic"
+    add(bot, oldest)
+    for i in range(1, bot.post_history.maxlen):
+        add(bot, f"Post number {i} about a shared gadget topic")
+    assert bot.is_duplicate(bot.post_hash(oldest), bot.shingles(oldest))
+
+    # The next post pushes the oldest one out of the history and the dedup indexes
+    add(bot, "A brand new post about home computers")
+    assert len(bot.post_history) == bot.post_history.maxlen
+    assert not bot.is_duplicate(bot.post_hash(oldest), bot.shingles(oldest))
+    assert bot.post_hash(oldest) not in bot._hash_set
+    assert len(bot._hash_set) == bot.post_history.maxlen
+    assert "post number zero about a" not in bot._shingle_counts
+    # Shingles shared with posts still in the history survive the eviction
+    assert bot._shingle_counts["about a shared gadget topic"] == bot.post_history.maxlen - 1
+
+
+def fake_stream(*pieces):
+    for piece in pieces:
+        yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=piece))])
+
+
+def test_stream_candidates_splits_lines_across_chunks(bot):
+    first = "The first webcam watched a coffee pot at Cambridge University."
+    second = "The original Game Boy could survive a bombing during the Gulf War."
+    stream = fake_stream("Here are 2 facts:\n1. The first webcam ", "watched a coffee pot at Cambridge ",
+                         "University.\n2. The original Game Boy could survive a bombing during the Gulf War.")
+    assert list(bot.stream_candidates(stream)) == [first, second]
+
+
+def test_stream_candidates_cuts_long_lines(bot):
+    long_line = "x" * 50
+    stream = fake_stream(long_line[:30], long_line[30:] + " and the rest", " of this line\n",
+                         "The next candidate is on its own line here.")
+    # The cut happens at the first chunk that reaches max_chars; the rest of that line is skipped
+    assert list(bot.stream_candidates(stream, max_chars=50)) == [
+        long_line + " and the rest",
+        "The next candidate is on its own line here.",
+    ]
+
+
+def test_run_in_daemon_thread(bot):
+    def fail():
+        raise ValueError("boom")
+
+    assert asyncio.run(bot.run_in_daemon_thread(lambda a, b: a + b, 2, 3)) == 5
+    with pytest.raises(ValueError, match="boom"):
+        asyncio.run(bot.run_in_daemon_thread(fail))
+
+
+@pytest.fixture
+def signal_handlers():
+    """Install sentinel SIGTERM/SIGINT handlers and put the originals back afterwards"""
+    originals = {signum: signal.getsignal(signum) for signum in (signal.SIGTERM, signal.SIGINT)}
+    sentinels = {}
+    for signum in originals:
+        sentinels[signum] = lambda _signum, _frame: None
+        signal.signal(signum, sentinels[signum])
+    yield sentinels
+    for signum, handler in originals.items():
+        signal.signal(signum, handler)
+
+
+async def run_until(bot, condition):
+    """Run the main loop until condition() holds, then stop it with SIGTERM"""
+    task = asyncio.ensure_future(bot.run_loop())
+    while not condition():
+        await asyncio.sleep(0.01)
+    os.kill(os.getpid(), signal.SIGTERM)
+    await asyncio.wait_for(task, timeout=5)
+
+
+def test_run_loop_cancel_restores_signal_handlers(bot, signal_handlers, monkeypatch):
+    generated = threading.Event()
+
+    def generate_post():
+        generated.set()
+        return None  # The loop then waits 5 minutes before retrying
+
+    monkeypatch.setattr(bot, "generate_post", generate_post)
+    asyncio.run(run_until(bot, generated.is_set))
+
+    for signum, handler in signal_handlers.items():
+        assert signal.getsignal(signum) is handler
+
+
+def test_run_loop_cancel_still_records_publish(bot, signal_handlers, monkeypatch):
+    post = "A post that is being published while the bot shuts down."
+    publishing = threading.Event()
+
+    def slow_post(status):
+        publishing.set()
+        threading.Event().wait(0.2)
+
+    monkeypatch.setattr(bot, "generate_post", lambda: (post, bot.post_hash(post), bot.shingles(post)))
+    monkeypatch.setattr(bot, "post", slow_post)
+    asyncio.run(run_until(bot, publishing.is_set))
+
+    assert [p["content"] for p in bot.post_history] == [post]